@@ -3,51 +3,65 @@ Configuration module for Max to Telegram bridge.
 Loads settings from environment variables.
 """
 
-import os
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Optional
 
-from pydantic_settings import BaseSettings
+from pydantic import ValidationInfo, field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
     """Application settings loaded from environment variables."""
 
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=False, extra="ignore")
+
     # GREEN-API settings
-    max_instance_id: str = os.getenv("MAX_INSTANCE_ID", "")
-    max_api_token: str = os.getenv("MAX_API_TOKEN", "")
+    max_instance_id: str = ""
+    max_api_token: str = ""
 
     # Telegram settings
-    telegram_bot_token: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
-    telegram_channel_id: str = os.getenv("TELEGRAM_CHANNEL_ID", "")
+    telegram_bot_token: str = ""
+    telegram_channel_id: str = ""
 
     # Max chat filtering
-    max_chat_id: Optional[str] = os.getenv("MAX_CHAT_ID")
+    max_chat_id: Optional[str] = None
 
     # Telegram webhook settings (for Telegram → Max direction)
-    telegram_webhook_url: Optional[str] = os.getenv("TELEGRAM_WEBHOOK_URL")
-    telegram_webhook_secret: Optional[str] = os.getenv("TELEGRAM_WEBHOOK_SECRET")
-    telegram_chat_id: Optional[str] = os.getenv(
-        "TELEGRAM_CHAT_ID"
-    )  # Filter Telegram messages from this chat
-    max_target_chat_id: str = os.getenv(
-        "MAX_TARGET_CHAT_ID", ""
-    )  # Where to send Telegram messages in Max
+    telegram_webhook_url: Optional[str] = None
+    telegram_webhook_secret: Optional[str] = None
+    telegram_chat_id: Optional[str] = None  # Filter Telegram messages from this chat
+    max_target_chat_id: str = ""  # Where to send Telegram messages in Max
 
     # Direction control flags
-    enable_max_to_telegram: bool = os.getenv("ENABLE_MAX_TO_TELEGRAM", "true").lower() == "true"
-    enable_telegram_to_max: bool = os.getenv("ENABLE_TELEGRAM_TO_MAX", "true").lower() == "true"
+    enable_max_to_telegram: bool = True
+    enable_telegram_to_max: bool = True
 
     # Server settings
-    webhook_port: int = int(os.getenv("WEBHOOK_PORT", "8000"))
-    webhook_host: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
-    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    webhook_port: int = 8000
+    webhook_host: str = "0.0.0.0"
+    log_level: str = "INFO"
+    access_log: bool = False
+    workers: int = 1  # uvicorn worker processes
+    webhook_workers: int = 4  # Background tasks sending Max messages to Telegram
 
     # Optional: Webhook secret for security (for GREEN-API → Telegram direction)
-    webhook_secret: Optional[str] = os.getenv("WEBHOOK_SECRET")
-
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
+    webhook_secret: Optional[str] = None
+
+    @field_validator("enable_max_to_telegram", "enable_telegram_to_max", mode="before")
+    @classmethod
+    def _parse_direction_flag(cls, value: Any) -> Any:
+        """Enable a direction only for "true" (any case), empty means disabled."""
+        if isinstance(value, str):
+            return value.lower() == "true"
+        return value
+
+    @field_validator("webhook_port", "workers", "webhook_workers", mode="before")
+    @classmethod
+    def _empty_as_default(cls, value: Any, info: ValidationInfo) -> Any:
+        """Use the default for numbers left empty in the environment."""
+        if value == "" and info.field_name is not None:
+            return cls.model_fields[info.field_name].default
+        return value
 
     def validate_settings(self) -> bool:
         """Validate that all required settings are present."""
@@ -67,6 +81,16 @@ class Settings(BaseSettings):
                 "ENABLE_MAX_TO_TELEGRAM=true или ENABLE_TELEGRAM_TO_MAX=true"
             )
 
+        # Send queues are per process, so with several processes neither order
+        # nor the drain on shutdown holds across them
+        if self.enable_max_to_telegram and self.workers > 1 and self.webhook_workers > 0:
+            raise ValueError(
+                "Очередь отправки в Telegram (WEBHOOK_WORKERS > 0) "
+                "нельзя использовать с несколькими процессами (WORKERS > 1): "
+                "порядок сообщений между процессами не сохраняется. "
+                "Установите WEBHOOK_WORKERS=0 или WORKERS=1"
+            )
+
         # Basic required settings
         required = [
             self.max_instance_id,
@@ -85,5 +109,27 @@ class Settings(BaseSettings):
         return all(required)
 
 
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the global settings instance, parsing the environment only once."""
+    return Settings()
+
+
+@lru_cache(maxsize=1)
+def validate_settings() -> bool:
+    """Validate the global settings once and cache the result."""
+    return get_settings().validate_settings()
+
+
+# Webhook body size limits (bytes)
+MAX_WEBHOOK_BODY = 1 << 20
+MAX_TELEGRAM_WEBHOOK_BODY = 100 * 1024
+
+
 # Global settings instance
-settings = Settings()
+settings = get_settings()
+
+# Plain copies of values read on every webhook
+TARGET_CHAT_ID = settings.max_chat_id
+ENABLE_M2T = settings.enable_max_to_telegram
+ENABLE_T2M = settings.enable_telegram_to_max
@@ -3,13 +3,51 @@ GREEN-API client for sending messages to Max messenger.
 Uses GREEN-API REST endpoints for async operations.
 """
 
+import asyncio
 import logging
+import re
 from typing import Optional
-import aiohttp
+import httpx
+import orjson
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# WhatsApp-style chat ID suffixes that Max doesn't use
+_SUFFIX_RE = re.compile(r"@[cg]\.us")
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Default captions for media sent without one
+_PHOTO_CAPTION = "📷 Photo"
+_VIDEO_CAPTION = "🎥 Video"
+
+# Maximum number of sendFileByUrl requests in flight at once
+_MAX_CONCURRENT_FILES = 8
+
+
+def _format_chat_id(chat_id: str) -> str:
+    """
+    Format chat ID for GREEN-API (Max messenger).
+    Max uses numeric chat IDs without suffixes.
+
+    Groups: negative IDs (e.g., -69020002426896)
+    Personal chats: positive IDs (e.g., 16958332)
+
+    Args:
+        chat_id: Chat ID (numeric) or with accidentally added suffix
+
+    Returns:
+        str: Clean numeric chat ID (e.g., -69020002426896 or 16958332)
+    """
+    # Plain numeric IDs are the common case
+    if "@" not in chat_id:
+        return chat_id
+
+    # Remove any accidentally added WhatsApp-style suffixes
+    # (Max doesn't use them, but users might add them by mistake)
+    return _SUFFIX_RE.sub("", chat_id)
+
 
 class GreenApiClient:
     """Client for sending messages to Max via GREEN-API."""
@@ -21,30 +59,31 @@ class GreenApiClient:
         # Extract server ID from instance ID (first 4 digits)
         server_id = str(self.instance_id)[:4]
         self.base_url = f"https://{server_id}.api.green-api.com/v3/waInstance{self.instance_id}"
+        self._send_message_url = f"{self.base_url}/sendMessage/{self.api_token}"
+        self._send_file_url = f"{self.base_url}/sendFileByUrl/{self.api_token}"
+        self._client: Optional[httpx.AsyncClient] = None
+        # Limit concurrent file uploads sharing the connection pool
+        self._semaphore = asyncio.Semaphore(_MAX_CONCURRENT_FILES)
         logger.info(
-            f"GREEN-API client initialized for instance: {self.instance_id} (server: {server_id})"
+            "GREEN-API client initialized for instance: %s (server: %s)",
+            self.instance_id,
+            server_id,
         )
 
-    def _format_chat_id(self, chat_id: str) -> str:
+    async def _get_client(self) -> httpx.AsyncClient:
         """
-        Format chat ID for GREEN-API (Max messenger).
-        Max uses numeric chat IDs without suffixes.
-
-        Groups: negative IDs (e.g., -69020002426896)
-        Personal chats: positive IDs (e.g., 16958332)
-
-        Args:
-            chat_id: Chat ID (numeric) or with accidentally added suffix
+        Get shared HTTP client, creating it on first use.
 
         Returns:
-            str: Clean numeric chat ID (e.g., -69020002426896 or 16958332)
+            httpx.AsyncClient: HTTP/2 client with a keep-alive connection pool
         """
-        # Remove any accidentally added WhatsApp-style suffixes
-        # (Max doesn't use them, but users might add them by mistake)
-        chat_id = chat_id.replace("@c.us", "").replace("@g.us", "")
-
-        # Return clean numeric ID
-        return chat_id
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                timeout=30.0,
+            )
+        return self._client
 
     async def send_text_message(
         self,
@@ -67,33 +106,42 @@ class GreenApiClient:
         """
         try:
             # Format chat ID
-            formatted_chat_id = self._format_chat_id(chat_id)
+            formatted_chat_id = _format_chat_id(chat_id)
 
             # Format message with sender info
             formatted_message = self._format_message(text, sender_name, sender_username)
 
             # Prepare API request
-            url = f"{self.base_url}/sendMessage/{self.api_token}"
             payload = {"chatId": formatted_chat_id, "message": formatted_message}
 
             # Send request
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        logger.info(
-                            f"Text message sent to Max: {text[:50]}... (ID: {result.get('idMessage')})"
-                        )
-                        return True
-                    else:
-                        error_text = await response.text()
-                        logger.error(
-                            f"Failed to send text to Max. Status: {response.status}, Error: {error_text}"
-                        )
-                        return False
+            client = await self._get_client()
+            response = await client.post(
+                self._send_message_url, content=orjson.dumps(payload), headers=_JSON_HEADERS
+            )
+            if response.status_code == 200:
+                result = orjson.loads(response.content)
+                logger.info(
+                    "Text message sent to Max: %.50s... (ID: %s)",
+                    text,
+                    result.get("idMessage"),
+                )
+                return True
+            else:
+                logger.error(
+                    "Failed to send text to Max. Status: %s, Error: %s",
+                    response.status_code,
+                    response.text,
+                )
+                return False
+
+        except httpx.TransportError as e:
+            # Network failures are expected from time to time, skip the traceback
+            logger.warning("Transient error sending text message to Max: %s", e)
+            return False
 
         except Exception as e:
-            logger.error(f"Error sending text message to Max: {e}", exc_info=True)
+            logger.error("Error sending text message to Max: %s", e, exc_info=True)
             return False
 
     async def send_file_by_url(
@@ -121,7 +169,7 @@ class GreenApiClient:
         """
         try:
             # Format chat ID
-            formatted_chat_id = self._format_chat_id(chat_id)
+            formatted_chat_id = _format_chat_id(chat_id)
 
             # Format caption with sender info
             formatted_caption = self._format_message(
@@ -129,7 +177,6 @@ class GreenApiClient:
             )
 
             # Prepare API request
-            url = f"{self.base_url}/sendFileByUrl/{self.api_token}"
             payload = {
                 "chatId": formatted_chat_id,
                 "urlFile": file_url,
@@ -138,21 +185,30 @@ class GreenApiClient:
             }
 
             # Send request
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        logger.info(f"File sent to Max: {filename} (ID: {result.get('idMessage')})")
-                        return True
-                    else:
-                        error_text = await response.text()
-                        logger.error(
-                            f"Failed to send file to Max. Status: {response.status}, Error: {error_text}"
-                        )
-                        return False
+            client = await self._get_client()
+            async with self._semaphore:
+                response = await client.post(
+                    self._send_file_url, content=orjson.dumps(payload), headers=_JSON_HEADERS
+                )
+            if response.status_code == 200:
+                result = orjson.loads(response.content)
+                logger.info("File sent to Max: %s (ID: %s)", filename, result.get("idMessage"))
+                return True
+            else:
+                logger.error(
+                    "Failed to send file to Max. Status: %s, Error: %s",
+                    response.status_code,
+                    response.text,
+                )
+                return False
+
+        except httpx.TransportError as e:
+            # Network failures are expected from time to time, skip the traceback
+            logger.warning("Transient error sending file to Max: %s", e)
+            return False
 
         except Exception as e:
-            logger.error(f"Error sending file to Max: {e}", exc_info=True)
+            logger.error("Error sending file to Max: %s", e, exc_info=True)
             return False
 
     async def send_photo(
@@ -177,7 +233,7 @@ class GreenApiClient:
             bool: True if photo sent successfully
         """
         return await self.send_file_by_url(
-            chat_id, photo_url, "photo.jpg", caption or "📷 Photo", sender_name, sender_username
+            chat_id, photo_url, "photo.jpg", caption or _PHOTO_CAPTION, sender_name, sender_username
         )
 
     async def send_video(
@@ -202,7 +258,7 @@ class GreenApiClient:
             bool: True if video sent successfully
         """
         return await self.send_file_by_url(
-            chat_id, video_url, "video.mp4", caption or "🎥 Video", sender_name, sender_username
+            chat_id, video_url, "video.mp4", caption or _VIDEO_CAPTION, sender_name, sender_username
         )
 
     async def send_document(
@@ -251,19 +307,21 @@ class GreenApiClient:
         Returns:
             str: Formatted message
         """
-        sender_info = []
-
+        if sender_name and sender_username:
+            return f"📨 *From Telegram:* 👤 {sender_name} | @{sender_username}\n\n{text}"
         if sender_name:
-            sender_info.append(f"👤 {sender_name}")
+            return f"📨 *From Telegram:* 👤 {sender_name}\n\n{text}"
         if sender_username:
-            sender_info.append(f"@{sender_username}")
-
-        if sender_info:
-            header = " | ".join(sender_info)
-            return f"📨 *From Telegram:* {header}\n\n{text}"
+            return f"📨 *From Telegram:* @{sender_username}\n\n{text}"
 
         return text
 
+    async def close(self):
+        """Close HTTP client."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        logger.info("GREEN-API client closed")
+
 
 # Global GREEN-API client instance
 green_api_client = GreenApiClient()
@@ -2,26 +2,61 @@
 Webhook handlers for processing incoming messages from GREEN-API (Max).
 """
 
+import asyncio
 import logging
-from typing import Dict, Any, Optional
-from pydantic import BaseModel, Field
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
-from app.config import settings
+from app.config import TARGET_CHAT_ID
 from app.telegram_client import telegram_client
 
 logger = logging.getLogger(__name__)
 
+# Outgoing message notifications (sent from the Max account itself)
+_OUTGOING_WEBHOOK_TYPES = frozenset({"outgoingMessageReceived", "outgoingAPIMessageReceived"})
 
-# Pydantic models for GREEN-API webhook payloads
-class MessageData(BaseModel):
-    """Message data from GREEN-API webhook."""
+# Webhook types that carry a message we may forward
+_ACCEPTED_WEBHOOK_TYPES = frozenset(
+    {
+        "incomingMessageReceived",
+        "incomingCall",
+        "outgoingMessageReceived",
+        "outgoingAPIMessageReceived",
+    }
+)
 
-    typeWebhook: str
-    instanceData: Optional[Dict[str, Any]] = None
-    timestamp: Optional[int] = None
-    idMessage: Optional[str] = None
-    senderData: Optional[Dict[str, Any]] = None
-    messageData: Optional[Dict[str, Any]] = None
+# Quoted type names looked up in the raw body before parsing it
+_ACCEPTED_WEBHOOK_MARKERS = tuple(f'"{t}"'.encode() for t in _ACCEPTED_WEBHOOK_TYPES)
+
+
+def may_be_message(body: bytes) -> bool:
+    """
+    Cheaply check raw webhook body before parsing it.
+
+    Args:
+        body: Raw webhook body
+
+    Returns:
+        bool: False if body can't contain an accepted webhook type
+    """
+    return any(marker in body for marker in _ACCEPTED_WEBHOOK_MARKERS)
+
+
+# Media message type → (telegram_client method, default filename, fixed caption).
+# Photo and video senders take no filename, so their default filename is None.
+_MEDIA_DISPATCH = {
+    "imageMessage": ("send_photo", None, None),
+    "videoMessage": ("send_video", None, None),
+    "documentMessage": ("send_document", "document", None),
+    "audioMessage": ("send_document", "audio.mp3", "🎵 Audio"),
+    "voiceMessage": ("send_document", "voice.ogg", "🎤 Voice message"),
+}
+
+# Maximum number of messages waiting in each worker's queue
+_QUEUE_MAXSIZE = 1000
+
+# How long to wait for queued messages to be sent on shutdown (seconds)
+_DRAIN_TIMEOUT = 10
 
 
 class WebhookHandler:
@@ -29,8 +64,79 @@ class WebhookHandler:
 
     def __init__(self):
         """Initialize webhook handler."""
-        self.target_chat_id = settings.max_chat_id
-        logger.info(f"Webhook handler initialized. Target chat: {self.target_chat_id or 'ALL'}")
+        self.target_chat_id = TARGET_CHAT_ID
+        # Message type → handler
+        self._dispatch: Dict[str, Callable[..., Awaitable[None]]] = {
+            "textMessage": self._handle_text_message,
+            "extendedTextMessage": self._handle_extended_text_message,
+        }
+        for type_message, (method_name, default_filename, caption) in _MEDIA_DISPATCH.items():
+            self._dispatch[type_message] = partial(
+                self._handle_media,
+                method_name=method_name,
+                default_filename=default_filename,
+                default_caption=caption,
+            )
+        # Outgoing sends are queued so webhooks are acknowledged without
+        # waiting for Telegram. Each worker owns one queue and every chat maps
+        # to a single queue, so messages of a chat are sent in order within
+        # this process. Queued messages live only in memory: whatever is left
+        # after the drain timeout or a crash is lost, GREEN-API won't resend it.
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        logger.info("Webhook handler initialized. Target chat: %s", self.target_chat_id or "ALL")
+
+    async def start(self, workers: int = 1):
+        """
+        Start background workers that send queued messages to Telegram.
+
+        Args:
+            workers: Number of worker tasks
+        """
+        for _ in range(workers):
+            queue: asyncio.Queue = asyncio.Queue(maxsize=_QUEUE_MAXSIZE)
+            self._queues.append(queue)
+            self._workers.append(asyncio.create_task(self._worker(queue)))
+        logger.info("Started %s webhook worker(s)", workers)
+
+    async def stop(self):
+        """Wait for queued messages to be sent and stop background workers."""
+        if not self._workers:
+            return
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)),
+                timeout=_DRAIN_TIMEOUT,
+            )
+        except TimeoutError:
+            logger.warning(
+                "Dropping %s queued message(s) on shutdown",
+                sum(queue.qsize() for queue in self._queues),
+            )
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
+        logger.info("Webhook workers stopped")
+
+    async def _worker(self, queue: asyncio.Queue):
+        """
+        Send messages from one queue to Telegram in the order they were queued.
+
+        Args:
+            queue: Queue owned by this worker
+        """
+        while True:
+            handler, message_data, sender_name, sender_phone = await queue.get()
+            try:
+                await handler(message_data, sender_name, sender_phone)
+            except Exception as e:
+                logger.error("Error sending queued message: %s", e, exc_info=True)
+            finally:
+                queue.task_done()
 
     def should_process_message(self, chat_id: Optional[str]) -> bool:
         """
@@ -62,63 +168,60 @@ class WebhookHandler:
         try:
             # Parse webhook type
             webhook_type = payload.get("typeWebhook")
-            logger.info(f"Received webhook type: {webhook_type}")
+            logger.info("Received webhook type: %s", webhook_type)
 
             # We're interested in incoming and outgoing message notifications
-            if webhook_type not in [
-                "incomingMessageReceived",
-                "incomingCall",
-                "outgoingMessageReceived",
-                "outgoingAPIMessageReceived",
-            ]:
-                logger.debug(f"Ignoring webhook type: {webhook_type}")
+            if webhook_type not in _ACCEPTED_WEBHOOK_TYPES:
+                logger.debug("Ignoring webhook type: %s", webhook_type)
                 return {"status": "ignored", "reason": "not_a_message"}
 
-            # Log full payload for debugging outgoing messages
-            if "outgoing" in webhook_type.lower():
-                logger.info(f"Outgoing webhook payload: {payload}")
-
-            # Extract message data
-            message_data = payload.get("messageData", {})
-            sender_data = payload.get("senderData", {})
-            instance_data = payload.get("instanceData", {})
-
-            # Get chat ID to check filter
+            # Check chat filter before doing any other work
+            sender_data = payload.get("senderData") or {}
             chat_id = sender_data.get("chatId") or sender_data.get("sender")
 
             if not self.should_process_message(chat_id):
-                logger.info(f"Skipping message from chat {chat_id} (not target chat)")
+                logger.info("Skipping message from chat %s (not target chat)", chat_id)
                 return {"status": "ignored", "reason": "chat_filter"}
 
+            # Log full payload for debugging outgoing messages
+            if webhook_type in _OUTGOING_WEBHOOK_TYPES:
+                logger.info("Outgoing webhook payload: %s", payload)
+
+            # Extract message data
+            message_data = payload.get("messageData") or {}
+
             # Extract sender info
             sender_name = sender_data.get("senderName") or sender_data.get("name")
-            sender_phone = sender_data.get("sender", "").replace("@c.us", "")
+            sender_phone = sender_data.get("sender", "")
+            if "@" in sender_phone:
+                sender_phone = sender_phone.replace("@c.us", "")
 
             # Process based on message type
-            type_message = message_data.get("typeMessage")
-
-            if type_message == "textMessage":
-                await self._handle_text_message(message_data, sender_name, sender_phone)
-            elif type_message == "extendedTextMessage":
-                await self._handle_extended_text_message(message_data, sender_name, sender_phone)
-            elif type_message == "imageMessage":
-                await self._handle_image_message(message_data, sender_name, sender_phone)
-            elif type_message == "videoMessage":
-                await self._handle_video_message(message_data, sender_name, sender_phone)
-            elif type_message == "documentMessage":
-                await self._handle_document_message(message_data, sender_name, sender_phone)
-            elif type_message == "audioMessage":
-                await self._handle_audio_message(message_data, sender_name, sender_phone)
-            elif type_message == "voiceMessage":
-                await self._handle_voice_message(message_data, sender_name, sender_phone)
-            else:
-                logger.warning(f"Unsupported message type: {type_message}")
+            type_message = message_data.get("typeMessage", "")
+
+            handler = self._dispatch.get(type_message)
+            if handler is None:
+                logger.warning("Unsupported message type: %s", type_message)
                 return {"status": "unsupported", "type": type_message}
 
-            return {"status": "success"}
+            if not self._workers:
+                await handler(message_data, sender_name, sender_phone)
+                return {"status": "success"}
+
+            # Same chat → same queue. If the queue is full, refuse the webhook
+            # so GREEN-API delivers it again later, rather than dropping the
+            # message or sending it ahead of the backlog.
+            queue = self._queues[hash(chat_id) % len(self._queues)]
+            try:
+                queue.put_nowait((handler, message_data, sender_name, sender_phone))
+            except asyncio.QueueFull:
+                logger.warning("Webhook queue is full, asking GREEN-API to retry")
+                return {"status": "busy", "reason": "queue_full"}
+
+            return {"status": "queued"}
 
         except Exception as e:
-            logger.error(f"Error handling webhook: {e}", exc_info=True)
+            logger.error("Error handling webhook: %s", e, exc_info=True)
             return {"status": "error", "message": str(e)}
 
     async def _handle_text_message(
@@ -137,75 +240,53 @@ class WebhookHandler:
         if text:
             await telegram_client.send_text_message(text, sender_name, sender_phone)
 
-    async def _handle_image_message(
-        self, message_data: Dict[str, Any], sender_name: Optional[str], sender_phone: Optional[str]
-    ):
-        """Handle image message."""
-        image_data = message_data.get("fileMessageData") or message_data.get("downloadUrl")
-        if isinstance(image_data, dict):
-            image_url = image_data.get("downloadUrl")
-            caption = message_data.get("caption")
-        else:
-            image_url = image_data
-            caption = None
-
-        if image_url:
-            await telegram_client.send_photo(image_url, caption, sender_name, sender_phone)
-
-    async def _handle_video_message(
-        self, message_data: Dict[str, Any], sender_name: Optional[str], sender_phone: Optional[str]
-    ):
-        """Handle video message."""
-        video_data = message_data.get("fileMessageData") or message_data.get("downloadUrl")
-        if isinstance(video_data, dict):
-            video_url = video_data.get("downloadUrl")
-            caption = message_data.get("caption")
-        else:
-            video_url = video_data
-            caption = None
-
-        if video_url:
-            await telegram_client.send_video(video_url, caption, sender_name, sender_phone)
+    @staticmethod
+    def _extract_file(message_data: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Extract file URL and name from message data.
 
-    async def _handle_document_message(
-        self, message_data: Dict[str, Any], sender_name: Optional[str], sender_phone: Optional[str]
-    ):
-        """Handle document message."""
-        doc_data = message_data.get("fileMessageData") or {}
-        document_url = doc_data.get("downloadUrl")
-        filename = doc_data.get("fileName") or "document"
-        caption = message_data.get("caption")
-
-        if document_url:
-            await telegram_client.send_document(
-                document_url, filename, caption, sender_name, sender_phone
-            )
+        Args:
+            message_data: messageData from GREEN-API webhook
 
-    async def _handle_audio_message(
-        self, message_data: Dict[str, Any], sender_name: Optional[str], sender_phone: Optional[str]
+        Returns:
+            tuple: (download_url, file_name), file_name is None if not provided
+        """
+        file_data = message_data.get("fileMessageData")
+        if not isinstance(file_data, dict):
+            file_data = {}
+        download_url = file_data.get("downloadUrl") or message_data.get("downloadUrl")
+        return download_url, file_data.get("fileName")
+
+    async def _handle_media(
+        self,
+        message_data: Dict[str, Any],
+        sender_name: Optional[str],
+        sender_phone: Optional[str],
+        method_name: str,
+        default_filename: Optional[str],
+        default_caption: Optional[str],
     ):
-        """Handle audio message (treat as document)."""
-        audio_data = message_data.get("fileMessageData") or {}
-        audio_url = audio_data.get("downloadUrl")
-        filename = audio_data.get("fileName") or "audio.mp3"
-
-        if audio_url:
-            await telegram_client.send_document(
-                audio_url, filename, "🎵 Audio", sender_name, sender_phone
-            )
+        """
+        Handle file message (image, video, document, audio, voice).
 
-    async def _handle_voice_message(
-        self, message_data: Dict[str, Any], sender_name: Optional[str], sender_phone: Optional[str]
-    ):
-        """Handle voice message (treat as document)."""
-        voice_data = message_data.get("fileMessageData") or {}
-        voice_url = voice_data.get("downloadUrl")
-        filename = voice_data.get("fileName") or "voice.ogg"
-
-        if voice_url:
-            await telegram_client.send_document(
-                voice_url, filename, "🎤 Voice message", sender_name, sender_phone
-            )
+        Args:
+            message_data: messageData from GREEN-API webhook
+            sender_name: Sender name
+            sender_phone: Sender phone
+            method_name: telegram_client method used to send the file
+            default_filename: Fallback filename, None if the method takes no filename
+            default_caption: Fixed caption overriding the message caption
+        """
+        file_url, filename = self._extract_file(message_data)
+        if not file_url:
+            return
+
+        caption = default_caption or message_data.get("caption")
+        send = getattr(telegram_client, method_name)
+        if default_filename is None:
+            await send(file_url, caption, sender_name, sender_phone)
+        else:
+            await send(file_url, filename or default_filename, caption, sender_name, sender_phone)
 
 
 # Global webhook handler instance
@@ -3,18 +3,29 @@ Main FastAPI application for Max to Telegram bridge.
 Receives webhooks from GREEN-API and forwards messages to Telegram.
 """
 
+import asyncio
+import hmac
 import logging
 import sys
 from contextlib import asynccontextmanager
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
+import orjson
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 
 import app.telegram_handlers as telegram_handlers
-from app.config import settings
-from app.handlers import webhook_handler
+from app.config import (
+    ENABLE_M2T,
+    ENABLE_T2M,
+    MAX_TELEGRAM_WEBHOOK_BODY,
+    MAX_WEBHOOK_BODY,
+    settings,
+    validate_settings,
+)
+from app.green_api_client import green_api_client
+from app.handlers import may_be_message, webhook_handler
 from app.telegram_client import telegram_client
 from app.telegram_handlers import init_telegram_handler
 
@@ -26,44 +37,62 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Log level is fixed at startup, skip payload debug logging entirely when off
+_DEBUG = logger.isEnabledFor(logging.DEBUG)
+
+# Several uvicorn worker processes share one Telegram webhook. WORKERS must
+# match the process count, also when uvicorn is started by hand.
+_MULTI_PROCESS = settings.workers > 1
+
+
+async def _register_telegram_webhook(url: str):
+    """Register Telegram webhook, re-raising errors so /health can report them."""
+    try:
+        await telegram_client.bot.set_webhook(
+            url=url,
+            secret_token=settings.telegram_webhook_secret,
+            # A worker starting next to running ones must not drop their updates
+            drop_pending_updates=not _MULTI_PROCESS,
+        )
+    except Exception as e:
+        logger.error("Failed to register Telegram webhook: %s", e)
+        logger.warning("Telegram → Max direction may not work without webhook registration")
+        raise
+    logger.info("Telegram webhook registered: %s", url)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager."""
     # Startup
+    app.state.webhook_ready = None
     logger.info("Starting Max to Telegram Bridge (Bidirectional)")
-    logger.info(f"Max → Telegram: {'ENABLED' if settings.enable_max_to_telegram else 'DISABLED'}")
-    logger.info(f"Telegram → Max: {'ENABLED' if settings.enable_telegram_to_max else 'DISABLED'}")
+    logger.info("Max → Telegram: %s", "ENABLED" if settings.enable_max_to_telegram else "DISABLED")
+    logger.info("Telegram → Max: %s", "ENABLED" if settings.enable_telegram_to_max else "DISABLED")
 
     # Validate settings
-    if not settings.validate_settings():
+    if not validate_settings():
         logger.error("Invalid configuration! Check your environment variables.")
         sys.exit(1)
 
     # Max → Telegram settings
     if settings.enable_max_to_telegram:
-        logger.info(f"Telegram channel: {settings.telegram_channel_id}")
-        logger.info(f"Max chat filter: {settings.max_chat_id or 'ALL CHATS'}")
+        logger.info("Telegram channel: %s", settings.telegram_channel_id)
+        logger.info("Max chat filter: %s", settings.max_chat_id or "ALL CHATS")
+        await webhook_handler.start(settings.webhook_workers)
 
     # Telegram → Max settings
     if settings.enable_telegram_to_max:
         # Initialize Telegram webhook handler
         init_telegram_handler(telegram_client.bot)
-        logger.info(f"Telegram chat filter: {settings.telegram_chat_id or 'ALL CHATS'}")
-        logger.info(f"Max target chat: {settings.max_target_chat_id}")
+        logger.info("Telegram chat filter: %s", settings.telegram_chat_id or "ALL CHATS")
+        logger.info("Max target chat: %s", settings.max_target_chat_id)
 
-        # Register Telegram webhook if URL is configured
+        # Register Telegram webhook in the background so startup isn't blocked
         if settings.telegram_webhook_url:
-            try:
-                await telegram_client.bot.set_webhook(
-                    url=settings.telegram_webhook_url,
-                    secret_token=settings.telegram_webhook_secret,
-                    drop_pending_updates=True,
-                )
-                logger.info(f"Telegram webhook registered: {settings.telegram_webhook_url}")
-            except Exception as e:
-                logger.error(f"Failed to register Telegram webhook: {e}")
-                logger.warning("Telegram → Max direction may not work without webhook registration")
+            app.state.webhook_ready = asyncio.create_task(
+                _register_telegram_webhook(settings.telegram_webhook_url)
+            )
         else:
             logger.warning(
                 "TELEGRAM_WEBHOOK_URL not set. Telegram → Max will not work until webhook is registered manually."
@@ -76,15 +105,22 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("Shutting down application")
 
-    # Delete Telegram webhook if enabled
+    # Delete Telegram webhook if enabled. With several workers one of them
+    # stopping must not unregister the webhook for the others.
     if settings.enable_telegram_to_max:
-        try:
-            await telegram_client.bot.delete_webhook(drop_pending_updates=True)
-            logger.info("Telegram webhook deleted")
-        except Exception as e:
-            logger.error(f"Failed to delete Telegram webhook: {e}")
+        if app.state.webhook_ready is not None:
+            # Let a pending registration finish so it can't re-register after deletion
+            await asyncio.gather(app.state.webhook_ready, return_exceptions=True)
+        if not _MULTI_PROCESS:
+            try:
+                await telegram_client.bot.delete_webhook(drop_pending_updates=True)
+                logger.info("Telegram webhook deleted")
+            except Exception as e:
+                logger.error("Failed to delete Telegram webhook: %s", e)
 
+    await webhook_handler.stop()
     await telegram_client.close()
+    await green_api_client.close()
     logger.info("Application stopped")
 
 
@@ -94,37 +130,102 @@ app = FastAPI(
     description="Forwards messages from Max messenger to Telegram channel via GREEN-API",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 
+def _secret_matches(provided: Optional[str], expected: str) -> bool:
+    """
+    Compare secret from request header in constant time.
+
+    Args:
+        provided: Header value from request
+        expected: Expected header value
+
+    Returns:
+        bool: True if header matches
+    """
+    if not provided:
+        return False
+    return hmac.compare_digest(provided.encode(), expected.encode())
+
+
+async def _read_body(request: Request, limit: int) -> bytes:
+    """
+    Read request body, rejecting it as soon as it exceeds the limit.
+
+    Args:
+        request: Incoming request
+        limit: Maximum body size in bytes
+
+    Returns:
+        bytes: Request body
+
+    Raises:
+        HTTPException: 413 if body is too large
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise HTTPException(status_code=413, detail="Request body too large")
+
+    # Content-Length may be missing or wrong (chunked bodies), enforce limit while reading
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail="Request body too large")
+    return bytes(body)
+
+
+# Responses that don't change while the app is running
+_ROOT_BODY = orjson.dumps(
+    {"status": "running", "service": "max-to-telegram-bridge", "version": "1.0.0"}
+)
+_HEALTH_STATIC: Dict[str, Any] = {
+    "status": "healthy",
+    "telegram_configured": bool(settings.telegram_bot_token),
+    "max_configured": bool(settings.max_instance_id and settings.max_api_token),
+    "directions": {
+        "max_to_telegram": settings.enable_max_to_telegram,
+        "telegram_to_max": settings.enable_telegram_to_max,
+    },
+    "max_to_telegram": {
+        "enabled": settings.enable_max_to_telegram,
+        "channel_id": settings.telegram_channel_id if settings.enable_max_to_telegram else None,
+        "chat_filter": settings.max_chat_id or "all",
+    },
+    "telegram_to_max": {
+        "enabled": settings.enable_telegram_to_max,
+        "chat_filter": settings.telegram_chat_id or "all",
+        "target_chat": settings.max_target_chat_id if settings.enable_telegram_to_max else None,
+    },
+}
+
+
 @app.get("/")
 async def root():
     """Health check endpoint."""
-    return {"status": "running", "service": "max-to-telegram-bridge", "version": "1.0.0"}
+    return Response(content=_ROOT_BODY, media_type="application/json")
+
+
+def _webhook_registered() -> bool:
+    """Check whether background Telegram webhook registration has succeeded."""
+    task = getattr(app.state, "webhook_ready", None)
+    return task is not None and task.done() and not task.cancelled() and task.exception() is None
 
 
 @app.get("/health")
 async def health_check():
     """Detailed health check."""
-    return {
-        "status": "healthy",
-        "telegram_configured": bool(settings.telegram_bot_token),
-        "max_configured": bool(settings.max_instance_id and settings.max_api_token),
-        "directions": {
-            "max_to_telegram": settings.enable_max_to_telegram,
-            "telegram_to_max": settings.enable_telegram_to_max,
-        },
-        "max_to_telegram": {
-            "enabled": settings.enable_max_to_telegram,
-            "channel_id": settings.telegram_channel_id if settings.enable_max_to_telegram else None,
-            "chat_filter": settings.max_chat_id or "all",
-        },
-        "telegram_to_max": {
-            "enabled": settings.enable_telegram_to_max,
-            "chat_filter": settings.telegram_chat_id or "all",
-            "target_chat": settings.max_target_chat_id if settings.enable_telegram_to_max else None,
-        },
-    }
+    return ORJSONResponse(
+        content={
+            **_HEALTH_STATIC,
+            "telegram_to_max": {
+                **_HEALTH_STATIC["telegram_to_max"],
+                "webhook_registered": _webhook_registered(),
+            },
+        }
+    )
 
 
 @app.post("/webhook")
@@ -153,32 +254,53 @@ async def webhook_endpoint(request: Request):
     """
     try:
         # Check if Max → Telegram is enabled
-        if not settings.enable_max_to_telegram:
+        if not ENABLE_M2T:
             logger.warning("Received Max webhook but Max → Telegram is disabled")
-            return JSONResponse(
+            return ORJSONResponse(
                 content={"status": "disabled", "message": "Max → Telegram direction is disabled"},
                 status_code=200,
             )
 
-        # Parse JSON payload
-        payload = await request.json()
-        logger.debug(f"Received webhook: {payload}")
-
-        # Verify webhook secret if configured
+        # Verify webhook secret if configured, before reading the body
         if settings.webhook_secret:
             auth_header = request.headers.get("Authorization")
-            if not auth_header or auth_header != f"Bearer {settings.webhook_secret}":
+            if not _secret_matches(auth_header, f"Bearer {settings.webhook_secret}"):
                 logger.warning("Unauthorized webhook request")
                 raise HTTPException(status_code=401, detail="Unauthorized")
 
+        # Skip parsing for status and other non-message notifications. Bodies
+        # without a message type are ignored even if they aren't valid JSON.
+        body = await _read_body(request, MAX_WEBHOOK_BODY)
+        if not may_be_message(body):
+            logger.debug("Ignoring non-message webhook")
+            return ORJSONResponse(
+                content={"status": "ignored", "reason": "not_a_message"}, status_code=200
+            )
+
+        # Parse JSON payload
+        payload = orjson.loads(body)
+        if _DEBUG:
+            logger.debug("Received webhook: %s", payload)
+
         # Process webhook
         result = await webhook_handler.handle_incoming_message(payload)
 
-        return JSONResponse(content=result, status_code=200)
+        # Queue full: 503 makes GREEN-API deliver the webhook again
+        status_code = 503 if result["status"] == "busy" else 200
+        return ORJSONResponse(content=result, status_code=status_code)
+
+    except HTTPException:
+        raise
+
+    except orjson.JSONDecodeError as e:
+        logger.warning("Invalid JSON in webhook: %s", e)
+        return ORJSONResponse(
+            content={"status": "error", "message": "Invalid JSON"}, status_code=400
+        )
 
     except Exception as e:
-        logger.error(f"Error processing webhook: {e}", exc_info=True)
-        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
+        logger.error("Error processing webhook: %s", e, exc_info=True)
+        return ORJSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
 
 
 @app.post("/telegram/webhook")
@@ -199,44 +321,54 @@ async def telegram_webhook_endpoint(request: Request):
     """
     try:
         # Check if Telegram → Max is enabled
-        if not settings.enable_telegram_to_max:
+        if not ENABLE_T2M:
             logger.warning("Received Telegram webhook but Telegram → Max is disabled")
-            return JSONResponse(
+            return ORJSONResponse(
                 content={"status": "disabled", "message": "Telegram → Max direction is disabled"},
                 status_code=200,
             )
 
-        # Verify secret token if configured
+        # Verify secret token if configured, before reading the body
         if settings.telegram_webhook_secret:
             secret_header = request.headers.get("X-Telegram-Bot-Api-Secret-Token")
-            if not secret_header or secret_header != settings.telegram_webhook_secret:
+            if not _secret_matches(secret_header, settings.telegram_webhook_secret):
                 logger.warning("Unauthorized Telegram webhook request")
                 raise HTTPException(status_code=401, detail="Unauthorized")
 
         # Parse JSON payload
-        update_data = await request.json()
-        logger.debug(f"Received Telegram update: {update_data}")
+        update_data = orjson.loads(await _read_body(request, MAX_TELEGRAM_WEBHOOK_BODY))
+        if _DEBUG:
+            logger.debug("Received Telegram update: %s", update_data)
 
         # Process update
         if telegram_handlers.telegram_webhook_handler:
             result = await telegram_handlers.telegram_webhook_handler.handle_update(update_data)
-            return JSONResponse(content=result, status_code=200)
+            return ORJSONResponse(content=result, status_code=200)
         else:
             logger.error("Telegram webhook handler not initialized")
-            return JSONResponse(
+            return ORJSONResponse(
                 content={"status": "error", "message": "Handler not initialized"}, status_code=500
             )
 
+    except HTTPException:
+        raise
+
+    except orjson.JSONDecodeError as e:
+        logger.warning("Invalid JSON in Telegram webhook: %s", e)
+        return ORJSONResponse(
+            content={"status": "error", "message": "Invalid JSON"}, status_code=400
+        )
+
     except Exception as e:
-        logger.error(f"Error processing Telegram webhook: {e}", exc_info=True)
-        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
+        logger.error("Error processing Telegram webhook: %s", e, exc_info=True)
+        return ORJSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
 
 
 @app.post("/test")
 async def test_endpoint(request: Request):
     """Test endpoint for manual message sending."""
     try:
-        data = await request.json()
+        data = orjson.loads(await request.body())
         text = data.get("text", "Test message from Max bridge")
         sender_name = data.get("sender_name", "Test User")
 
@@ -244,21 +376,30 @@ async def test_endpoint(request: Request):
 
         return {"status": "success", "message": "Test message sent to Telegram"}
 
+    except orjson.JSONDecodeError as e:
+        logger.warning("Invalid JSON in test request: %s", e)
+        return ORJSONResponse(
+            content={"status": "error", "message": "Invalid JSON"}, status_code=400
+        )
+
     except Exception as e:
-        logger.error(f"Error in test endpoint: {e}", exc_info=True)
-        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
+        logger.error("Error in test endpoint: %s", e, exc_info=True)
+        return ORJSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
 
 
 def main():
     """Run the application."""
-    logger.info(f"Starting server on {settings.webhook_host}:{settings.webhook_port}")
+    logger.info("Starting server on %s:%s", settings.webhook_host, settings.webhook_port)
 
     uvicorn.run(
         "app.main:app",
         host=settings.webhook_host,
         port=settings.webhook_port,
         log_level=settings.log_level.lower(),
-        access_log=True,
+        loop="uvloop",
+        http="httptools",
+        access_log=settings.access_log,
+        workers=settings.workers,
     )
 
 
@@ -3,20 +3,50 @@ Telegram client for sending messages to Telegram channel.
 Uses aiogram for async operations.
 """
 
+import asyncio
+import html
 import logging
 import os
 import tempfile
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Optional
 
 import aiohttp
 from aiogram import Bot
-from aiogram.exceptions import TelegramAPIError
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
 from aiogram.types import FSInputFile
 
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Size of chunks streamed from media downloads to disk
+_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# sendDocument by URL only works for these file types
+_URL_DOCUMENT_SUFFIXES = (".pdf", ".zip", ".gif")
+
+# Bad Request messages meaning Telegram could not fetch a file by URL
+_URL_FETCH_ERRORS = (
+    "wrong file identifier/http url specified",
+    "failed to get http url content",
+    "wrong type of the web page content",
+)
+
+
+@lru_cache(maxsize=1024)
+def _header_for(sender_name: str) -> str:
+    """
+    Build message header for sender (cached, chats usually have few senders).
+
+    Args:
+        sender_name: Sender name
+
+    Returns:
+        str: HTML header followed by a blank line
+    """
+    return f"👤 <b>{html.escape(sender_name)}</b>\n\n"
+
 
 class TelegramClient:
     """Client for sending messages to Telegram channel."""
@@ -25,7 +55,45 @@ class TelegramClient:
         """Initialize Telegram bot."""
         self.bot = Bot(token=settings.telegram_bot_token)
         self.channel_id = settings.telegram_channel_id
-        logger.info(f"Telegram client initialized for channel: {self.channel_id}")
+        self._session: Optional[aiohttp.ClientSession] = None
+        logger.info("Telegram client initialized for channel: %s", self.channel_id)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Get shared HTTP session for file downloads, creating it on first use.
+
+        Returns:
+            aiohttp.ClientSession: Session with a keep-alive connection pool
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=64, ttl_dns_cache=300, keepalive_timeout=60),
+                read_bufsize=_DOWNLOAD_CHUNK_SIZE,
+            )
+        return self._session
+
+    async def _send_by_url(self, method: Callable[..., Awaitable[Any]], **kwargs: Any) -> bool:
+        """
+        Send media by URL, letting Telegram fetch the file itself.
+
+        Args:
+            method: Bot send method (send_photo, send_video, send_document)
+            **kwargs: Method arguments, with the file URL as the media field
+
+        Returns:
+            bool: True if sent, False if Telegram could not fetch the URL
+
+        Raises:
+            TelegramBadRequest: For other errors (e.g. caption), an upload would fail too
+        """
+        try:
+            await method(chat_id=self.channel_id, parse_mode="HTML", **kwargs)
+            return True
+        except TelegramBadRequest as e:
+            if not any(error in e.message.lower() for error in _URL_FETCH_ERRORS):
+                raise
+            logger.debug("Telegram could not fetch media by URL, uploading instead: %s", e)
+            return False
 
     async def send_text_message(
         self, text: str, sender_name: Optional[str] = None, sender_phone: Optional[str] = None
@@ -48,11 +116,11 @@ class TelegramClient:
             await self.bot.send_message(
                 chat_id=self.channel_id, text=formatted_message, parse_mode="HTML"
             )
-            logger.info(f"Text message sent to Telegram: {text[:50]}...")
+            logger.info("Text message sent to Telegram: %.50s...", text)
             return True
 
         except TelegramAPIError as e:
-            logger.error(f"Failed to send text message to Telegram: {e}")
+            logger.error("Failed to send text message to Telegram: %s", e)
             return False
 
     async def send_photo(
@@ -79,9 +147,19 @@ class TelegramClient:
                 caption or "📷 Photo", sender_name, sender_phone
             )
 
+            # Let Telegram fetch the photo, upload it ourselves only if that fails
+            if await self._send_by_url(
+                self.bot.send_photo, photo=photo_url, caption=formatted_caption
+            ):
+                logger.info("Photo sent to Telegram by URL: %.50s...", photo_url)
+                return True
+
             # Download photo and send
             temp_file = await self._download_file(photo_url)
-            if temp_file:
+            if not temp_file:
+                return False
+
+            try:
                 photo = FSInputFile(temp_file)
                 await self.bot.send_photo(
                     chat_id=self.channel_id,
@@ -89,13 +167,13 @@ class TelegramClient:
                     caption=formatted_caption,
                     parse_mode="HTML",
                 )
-                os.unlink(temp_file)  # Clean up temp file
-                logger.info(f"Photo sent to Telegram: {photo_url[:50]}...")
-                return True
-            return False
+            finally:
+                await self._remove_file(temp_file)  # Clean up temp file
+            logger.info("Photo sent to Telegram: %.50s...", photo_url)
+            return True
 
         except TelegramAPIError as e:
-            logger.error(f"Failed to send photo to Telegram: {e}")
+            logger.error("Failed to send photo to Telegram: %s", e)
             return False
 
     async def send_document(
@@ -124,9 +202,20 @@ class TelegramClient:
                 caption or f"📄 {filename or 'Document'}", sender_name, sender_phone
             )
 
+            # Telegram fetches only some document types by URL
+            by_url = (filename or document_url).lower().endswith(_URL_DOCUMENT_SUFFIXES)
+            if by_url and await self._send_by_url(
+                self.bot.send_document, document=document_url, caption=formatted_caption
+            ):
+                logger.info("Document sent to Telegram by URL: %s", filename)
+                return True
+
             # Download document and send
             temp_file = await self._download_file(document_url)
-            if temp_file:
+            if not temp_file:
+                return False
+
+            try:
                 document = FSInputFile(temp_file, filename=filename)
                 await self.bot.send_document(
                     chat_id=self.channel_id,
@@ -134,13 +223,13 @@ class TelegramClient:
                     caption=formatted_caption,
                     parse_mode="HTML",
                 )
-                os.unlink(temp_file)  # Clean up temp file
-                logger.info(f"Document sent to Telegram: {filename}")
-                return True
-            return False
+            finally:
+                await self._remove_file(temp_file)  # Clean up temp file
+            logger.info("Document sent to Telegram: %s", filename)
+            return True
 
         except TelegramAPIError as e:
-            logger.error(f"Failed to send document to Telegram: {e}")
+            logger.error("Failed to send document to Telegram: %s", e)
             return False
 
     async def send_video(
@@ -167,9 +256,19 @@ class TelegramClient:
                 caption or "🎥 Video", sender_name, sender_phone
             )
 
+            # Let Telegram fetch the video, upload it ourselves only if that fails
+            if await self._send_by_url(
+                self.bot.send_video, video=video_url, caption=formatted_caption
+            ):
+                logger.info("Video sent to Telegram by URL: %.50s...", video_url)
+                return True
+
             # Download video and send
             temp_file = await self._download_file(video_url)
-            if temp_file:
+            if not temp_file:
+                return False
+
+            try:
                 video = FSInputFile(temp_file)
                 await self.bot.send_video(
                     chat_id=self.channel_id,
@@ -177,13 +276,13 @@ class TelegramClient:
                     caption=formatted_caption,
                     parse_mode="HTML",
                 )
-                os.unlink(temp_file)  # Clean up temp file
-                logger.info(f"Video sent to Telegram: {video_url[:50]}...")
-                return True
-            return False
+            finally:
+                await self._remove_file(temp_file)  # Clean up temp file
+            logger.info("Video sent to Telegram: %.50s...", video_url)
+            return True
 
         except TelegramAPIError as e:
-            logger.error(f"Failed to send video to Telegram: {e}")
+            logger.error("Failed to send video to Telegram: %s", e)
             return False
 
     def _format_message(
@@ -200,10 +299,7 @@ class TelegramClient:
         Returns:
             str: Formatted message
         """
-        if sender_name:
-            header = f"👤 <b>{sender_name}</b>"
-            return f"{header}\n\n{text}"
-        return text
+        return _header_for(sender_name) + text if sender_name else text
 
     async def _download_file(self, url: str) -> Optional[str]:
         """
@@ -215,24 +311,47 @@ class TelegramClient:
         Returns:
             Optional[str]: Path to temporary file or None if failed
         """
+        path = None
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        # Create temporary file
-                        suffix = os.path.splitext(url)[1] or ""
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                            content = await response.read()
-                            tmp.write(content)
-                            return tmp.name
+            session = await self._get_session()
+            async with session.get(url) as response:
+                if response.status == 200:
+                    # Create temporary file
+                    suffix = os.path.splitext(url)[1] or ""
+                    fd, path = tempfile.mkstemp(suffix=suffix)
+                    try:
+                        # Stream to disk instead of buffering the whole file in memory
+                        async for chunk in response.content.iter_chunked(_DOWNLOAD_CHUNK_SIZE):
+                            view = memoryview(chunk)
+                            while view:
+                                view = view[os.write(fd, view) :]
+                    finally:
+                        os.close(fd)
+                    return path
             return None
         except Exception as e:
-            logger.error(f"Failed to download file from {url}: {e}")
+            logger.error("Failed to download file from %s: %s", url, e)
+            if path:
+                await self._remove_file(path)  # Don't leave partial downloads behind
             return None
 
+    async def _remove_file(self, path: str):
+        """
+        Remove temporary file without blocking the event loop.
+
+        Args:
+            path: File path
+        """
+        try:
+            await asyncio.to_thread(os.unlink, path)
+        except OSError as e:
+            logger.warning("Failed to remove temporary file %s: %s", path, e)
+
     async def close(self):
-        """Close bot session."""
+        """Close bot and download sessions."""
         await self.bot.session.close()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
         logger.info("Telegram client closed")
 
 
@@ -4,10 +4,10 @@ Receives messages from Telegram and forwards to Max via GREEN-API.
 """
 
 import logging
-from typing import Dict, Any, Optional, List
-from aiogram import Bot, Dispatcher
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.enums import ContentType
 from aiogram.types import Message, Update, PhotoSize
-from aiogram.filters import CommandStart
 
 from app.config import settings
 from app.green_api_client import green_api_client
@@ -26,66 +26,57 @@ class TelegramWebhookHandler:
             bot: aiogram Bot instance
         """
         self.bot = bot
+        # Dispatcher only feeds updates to this one router
+        self.router = Router()
         self.dispatcher = Dispatcher()
+        self.dispatcher.include_router(self.router)
         self.target_chat_id = settings.telegram_chat_id
+        # Telegram chat IDs are integers, compare them without str() conversions
+        self._target_chat_id_int: Optional[int] = (
+            int(self.target_chat_id) if self.target_chat_id else None
+        )
         self.max_target_chat = settings.max_target_chat_id
+        self._file_url_prefix = f"https://api.telegram.org/file/bot{bot.token}/"
+        # Content type → handler, filled in by _register_handlers
+        self._content_handlers: Dict[str, Callable[[Message], Awaitable[None]]] = {}
 
         # Register message handlers
         self._register_handlers()
 
-        logger.info(f"Telegram webhook handler initialized")
-        logger.info(f"Target Telegram chat: {self.target_chat_id or 'ALL'}")
-        logger.info(f"Target Max chat: {self.max_target_chat}")
+        logger.info("Telegram webhook handler initialized")
+        logger.info("Target Telegram chat: %s", self.target_chat_id or "ALL")
+        logger.info("Target Max chat: %s", self.max_target_chat)
 
     def _register_handlers(self):
-        """Register message handlers with dispatcher."""
-        # Text messages
-        self.dispatcher.message.register(
-            self._handle_text_message,
-            lambda message: message.text and not message.text.startswith("/"),
-        )
-
-        # Photos
-        self.dispatcher.message.register(
-            self._handle_photo_message, lambda message: message.photo is not None
-        )
-
-        # Videos
-        self.dispatcher.message.register(
-            self._handle_video_message, lambda message: message.video is not None
-        )
-
-        # Documents
-        self.dispatcher.message.register(
-            self._handle_document_message, lambda message: message.document is not None
-        )
-
-        # Voice messages
-        self.dispatcher.message.register(
-            self._handle_voice_message, lambda message: message.voice is not None
+        """Register message handlers with router."""
+        # Chat filter is applied by aiogram before any handler runs
+        if self._target_chat_id_int is not None:
+            self.router.message.filter(F.chat.id == self._target_chat_id_int)
+
+        # Content type → handler. Animations also carry a document and are
+        # forwarded as one.
+        self._content_handlers = {
+            ContentType.TEXT: self._handle_text_message,
+            ContentType.PHOTO: self._handle_photo_message,
+            ContentType.VIDEO: self._handle_video_message,
+            ContentType.DOCUMENT: self._handle_document_message,
+            ContentType.ANIMATION: self._handle_document_message,
+            ContentType.VOICE: self._handle_voice_message,
+            ContentType.AUDIO: self._handle_audio_message,
+        }
+
+        # Single handler, routed by content type
+        self.router.message.register(
+            self._route_message, F.content_type.in_(self._content_handlers)
         )
 
-        # Audio files
-        self.dispatcher.message.register(
-            self._handle_audio_message, lambda message: message.audio is not None
-        )
-
-    def should_process_message(self, chat_id: int) -> bool:
-        """
-        Check if message from this chat should be processed.
-
-        Args:
-            chat_id: Telegram chat ID
-
-        Returns:
-            bool: True if message should be processed
-        """
-        # If no specific chat filter is set, process all messages
-        if not self.target_chat_id:
-            return True
+    async def _route_message(self, message: Message):
+        """Route message to the handler for its content type."""
+        # Bot commands are not forwarded
+        if message.text and message.text.startswith("/"):
+            return
 
-        # Process only messages from target chat
-        return str(chat_id) == str(self.target_chat_id)
+        await self._content_handlers[message.content_type](message)
 
     async def handle_update(self, update_data: Dict[str, Any]) -> Dict[str, str]:
         """
@@ -98,8 +89,8 @@ class TelegramWebhookHandler:
             Dict with status
         """
         try:
-            # Parse update
-            update = Update(**update_data)
+            # Parse update (same path as aiogram's own webhook handling)
+            update = Update.model_validate(update_data, context={"bot": self.bot})
 
             # Feed update to dispatcher
             await self.dispatcher.feed_update(bot=self.bot, update=update)
@@ -107,7 +98,7 @@ class TelegramWebhookHandler:
             return {"status": "success"}
 
         except Exception as e:
-            logger.error(f"Error handling Telegram update: {e}", exc_info=True)
+            logger.error("Error handling Telegram update: %s", e, exc_info=True)
             return {"status": "error", "message": str(e)}
 
     def _get_sender_info(self, message: Message) -> tuple[Optional[str], Optional[str]]:
@@ -135,18 +126,13 @@ class TelegramWebhookHandler:
     async def _handle_text_message(self, message: Message):
         """Handle text message from Telegram."""
         try:
-            # Check if should process
-            if not self.should_process_message(message.chat.id):
-                logger.debug(f"Skipping message from chat {message.chat.id}")
-                return
-
             # Get sender info
             sender_name, sender_username = self._get_sender_info(message)
 
             # Get text
             text = message.text or ""
 
-            logger.info(f"Processing text message from Telegram: {text[:50]}...")
+            logger.info("Processing text message from Telegram: %.50s...", text)
 
             # Send to Max
             await green_api_client.send_text_message(
@@ -157,16 +143,11 @@ class TelegramWebhookHandler:
             )
 
         except Exception as e:
-            logger.error(f"Error handling text message: {e}", exc_info=True)
+            logger.error("Error handling text message: %s", e, exc_info=True)
 
     async def _handle_photo_message(self, message: Message):
         """Handle photo message from Telegram."""
         try:
-            # Check if should process
-            if not self.should_process_message(message.chat.id):
-                logger.debug(f"Skipping photo from chat {message.chat.id}")
-                return
-
             # Get sender info
             sender_name, sender_username = self._get_sender_info(message)
 
@@ -175,12 +156,14 @@ class TelegramWebhookHandler:
 
             # Get file URL
             file = await self.bot.get_file(photo.file_id)
-            file_url = f"https://api.telegram.org/file/bot{self.bot.token}/{file.file_path}"
+            if not file.file_path:
+                return
+            file_url = self._file_url_prefix + file.file_path
 
             # Get caption
             caption = message.caption
 
-            logger.info(f"Processing photo from Telegram: {photo.file_id}")
+            logger.info("Processing photo from Telegram: %s", photo.file_id)
 
             # Send to Max
             await green_api_client.send_photo(
@@ -192,16 +175,11 @@ class TelegramWebhookHandler:
             )
 
         except Exception as e:
-            logger.error(f"Error handling photo message: {e}", exc_info=True)
+            logger.error("Error handling photo message: %s", e, exc_info=True)
 
     async def _handle_video_message(self, message: Message):
         """Handle video message from Telegram."""
         try:
-            # Check if should process
-            if not self.should_process_message(message.chat.id):
-                logger.debug(f"Skipping video from chat {message.chat.id}")
-                return
-
             # Get sender info
             sender_name, sender_username = self._get_sender_info(message)
 
@@ -210,12 +188,14 @@ class TelegramWebhookHandler:
 
             # Get file URL
             file = await self.bot.get_file(video.file_id)
-            file_url = f"https://api.telegram.org/file/bot{self.bot.token}/{file.file_path}"
+            if not file.file_path:
+                return
+            file_url = self._file_url_prefix + file.file_path
 
             # Get caption
             caption = message.caption
 
-            logger.info(f"Processing video from Telegram: {video.file_id}")
+            logger.info("Processing video from Telegram: %s", video.file_id)
 
             # Send to Max
             await green_api_client.send_video(
@@ -227,16 +207,11 @@ class TelegramWebhookHandler:
             )
 
         except Exception as e:
-            logger.error(f"Error handling video message: {e}", exc_info=True)
+            logger.error("Error handling video message: %s", e, exc_info=True)
 
     async def _handle_document_message(self, message: Message):
         """Handle document message from Telegram."""
         try:
-            # Check if should process
-            if not self.should_process_message(message.chat.id):
-                logger.debug(f"Skipping document from chat {message.chat.id}")
-                return
-
             # Get sender info
             sender_name, sender_username = self._get_sender_info(message)
 
@@ -245,13 +220,15 @@ class TelegramWebhookHandler:
 
             # Get file URL
             file = await self.bot.get_file(document.file_id)
-            file_url = f"https://api.telegram.org/file/bot{self.bot.token}/{file.file_path}"
+            if not file.file_path:
+                return
+            file_url = self._file_url_prefix + file.file_path
 
             # Get filename and caption
             filename = document.file_name or "document"
             caption = message.caption
 
-            logger.info(f"Processing document from Telegram: {filename}")
+            logger.info("Processing document from Telegram: %s", filename)
 
             # Send to Max
             await green_api_client.send_document(
@@ -264,16 +241,11 @@ class TelegramWebhookHandler:
             )
 
         except Exception as e:
-            logger.error(f"Error handling document message: {e}", exc_info=True)
+            logger.error("Error handling document message: %s", e, exc_info=True)
 
     async def _handle_voice_message(self, message: Message):
         """Handle voice message from Telegram."""
         try:
-            # Check if should process
-            if not self.should_process_message(message.chat.id):
-                logger.debug(f"Skipping voice from chat {message.chat.id}")
-                return
-
             # Get sender info
             sender_name, sender_username = self._get_sender_info(message)
 
@@ -282,9 +254,11 @@ class TelegramWebhookHandler:
 
             # Get file URL
             file = await self.bot.get_file(voice.file_id)
-            file_url = f"https://api.telegram.org/file/bot{self.bot.token}/{file.file_path}"
+            if not file.file_path:
+                return
+            file_url = self._file_url_prefix + file.file_path
 
-            logger.info(f"Processing voice message from Telegram: {voice.file_id}")
+            logger.info("Processing voice message from Telegram: %s", voice.file_id)
 
             # Send to Max as document
             await green_api_client.send_document(
@@ -297,16 +271,11 @@ class TelegramWebhookHandler:
             )
 
         except Exception as e:
-            logger.error(f"Error handling voice message: {e}", exc_info=True)
+            logger.error("Error handling voice message: %s", e, exc_info=True)
 
     async def _handle_audio_message(self, message: Message):
         """Handle audio message from Telegram."""
         try:
-            # Check if should process
-            if not self.should_process_message(message.chat.id):
-                logger.debug(f"Skipping audio from chat {message.chat.id}")
-                return
-
             # Get sender info
             sender_name, sender_username = self._get_sender_info(message)
 
@@ -315,12 +284,14 @@ class TelegramWebhookHandler:
 
             # Get file URL
             file = await self.bot.get_file(audio.file_id)
-            file_url = f"https://api.telegram.org/file/bot{self.bot.token}/{file.file_path}"
+            if not file.file_path:
+                return
+            file_url = self._file_url_prefix + file.file_path
 
             # Get filename
             filename = audio.file_name or "audio.mp3"
 
-            logger.info(f"Processing audio from Telegram: {filename}")
+            logger.info("Processing audio from Telegram: %s", filename)
 
             # Send to Max as document
             await green_api_client.send_document(
@@ -333,7 +304,7 @@ class TelegramWebhookHandler:
             )
 
         except Exception as e:
-            logger.error(f"Error handling audio message: {e}", exc_info=True)
+            logger.error("Error handling audio message: %s", e, exc_info=True)
 
 
 # Global handler instance will be created in main.py